@@ -7,7 +7,9 @@ import tempfile
 import pytest
 import yaml
 
+import linker
 import machine
+import multicore
 import translator
 
 
@@ -43,3 +45,88 @@ def test_translator_and_machine(golden, caplog):
         assert data == golden.out["out_data"]
         assert stdout.getvalue() == golden.out["out_stdout"]
         assert caplog.text == golden.out["out_log"]
+
+
+@pytest.mark.golden_test("golden/scheduler/*.yml")
+def test_multiprogram_scheduler(golden, caplog):
+    caplog.set_level(logging.DEBUG)
+
+    with tempfile.TemporaryDirectory() as tmpdirname:
+        input_stream = os.path.join(tmpdirname, "input.yml")
+        with open(input_stream, "w", encoding="utf-8") as file:
+            yaml.dump(golden["in_stdin"], file)
+
+        programs = []
+        for number, source in enumerate(golden["in_sources"]):
+            prog = os.path.join(tmpdirname, f"prog{number}.txt")
+            data = os.path.join(tmpdirname, f"data{number}.json")
+            instr = os.path.join(tmpdirname, f"instr{number}.json")
+            with open(prog, "w", encoding="utf-8") as file:
+                file.write(source)
+            translator.Translator(prog, instr, data).translate()
+            programs.append((instr, data))
+
+        with contextlib.redirect_stdout(io.StringIO()) as stdout:
+            machine.multiprogram_main(programs=programs, input_f=input_stream, quantum=golden["in_quantum"])
+
+        assert stdout.getvalue() == golden.out["out_stdout"]
+        assert caplog.text == golden.out["out_log"]
+
+
+@pytest.mark.golden_test("golden/multicore/*.yml")
+def test_multicore(golden, caplog):
+    caplog.set_level(logging.DEBUG)
+
+    with tempfile.TemporaryDirectory() as tmpdirname:
+        prog = os.path.join(tmpdirname, "prog.txt")
+        input_stream = os.path.join(tmpdirname, "input.yml")
+        data = os.path.join(tmpdirname, "data.json")
+        instr = os.path.join(tmpdirname, "instr.json")
+
+        with open(prog, "w", encoding="utf-8") as file:
+            file.write(golden["in_source"])
+        with open(input_stream, "w", encoding="utf-8") as file:
+            yaml.dump(golden["in_stdin"], file)
+
+        translator.Translator(prog, instr, data).translate()
+        with contextlib.redirect_stdout(io.StringIO()) as stdout:
+            multicore.main(instr_f=instr, data_f=data, input_f=input_stream, cores=golden["in_cores"])
+
+        assert stdout.getvalue() == golden.out["out_stdout"]
+        assert caplog.text == golden.out["out_log"]
+
+
+@pytest.mark.golden_test("golden/link/*.yml")
+def test_separate_compilation(golden, caplog):
+    caplog.set_level(logging.DEBUG)
+
+    with tempfile.TemporaryDirectory() as tmpdirname:
+        input_stream = os.path.join(tmpdirname, "input.yml")
+        data = os.path.join(tmpdirname, "data.json")
+        instr = os.path.join(tmpdirname, "instr.json")
+        with open(input_stream, "w", encoding="utf-8") as file:
+            yaml.dump(golden["in_stdin"], file)
+
+        objects = []
+        for number, source in enumerate(golden["in_sources"]):
+            prog = os.path.join(tmpdirname, f"prog{number}.txt")
+            obj = os.path.join(tmpdirname, f"prog{number}.o.json")
+            with open(prog, "w", encoding="utf-8") as file:
+                file.write(source)
+            translator.Translator(prog, obj).translate_object()
+            objects.append(obj)
+
+        linker.main(out_instr=instr, out_data=data, object_files=objects)
+        with contextlib.redirect_stdout(io.StringIO()) as stdout:
+            machine.main(instr_f=instr, data_f=data, input_f=input_stream)
+
+        with open(instr, encoding="utf-8") as file:
+            code = file.read()
+
+        with open(data, encoding="utf-8") as file:
+            data = file.read()
+
+        assert code == golden.out["out_code"]
+        assert data == golden.out["out_data"]
+        assert stdout.getvalue() == golden.out["out_stdout"]
+        assert caplog.text == golden.out["out_log"]
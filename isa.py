@@ -22,6 +22,33 @@ class Opcode(str, Enum):
     indirect = ("indirect",)
     jn = ("jn",)
     jnn = "jnn"
+    mul = "mul"
+    div = "div"
+    shl = "shl"
+    shr = "shr"
+    and_ = "and"
+    or_ = "or"
+    cid = "cid"
+    ncores = "ncores"
+    tas = "tas"
+    call = "call"
+    ret = "ret"
+
+
+# Instructions which accept an immediate operand: "add #1"
+immediate_instructions = {
+    Opcode.load,
+    Opcode.add,
+    Opcode.sub,
+    Opcode.mod,
+    Opcode.cmp,
+    Opcode.mul,
+    Opcode.div,
+    Opcode.shl,
+    Opcode.shr,
+    Opcode.and_,
+    Opcode.or_,
+}
 
 
 class DataType(Enum):
@@ -39,7 +66,8 @@ def load_code_data(inst, data):
     with open(inst, encoding="utf-8") as f:
         instructions = json.loads(f.read())
         for inst in instructions:
-            inst["opcode"] = Opcode[inst["opcode"]]
+            inst["opcode"] = Opcode(inst["opcode"])
+            inst["immediate"] = inst.get("immediate", False)
             if inst["arg"] != "None":
                 inst["arg"] = int(inst["arg"])
             else:
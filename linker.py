@@ -0,0 +1,97 @@
+import argparse
+import json
+
+from isa import write_code
+
+
+class Linker:
+    """Компоновщик объектных файлов транслятора в один образ программы.
+
+    Секции text и data модулей размещаются подряд в порядке аргументов,
+    адреса из таблицы перемещений сдвигаются на начало секции метки,
+    ссылки на внешние символы заменяются адресами из таблицы экспорта.
+    """
+
+    objects: list[dict]
+    text: list[dict]
+    data: list[dict]
+    # Name of symbol -> position of its label in the linked image
+    symbols: dict
+
+    def __init__(self, object_files: list[str]) -> None:
+        self.objects = [self.read_object(path) for path in object_files]
+        self.text = []
+        self.data = []
+        self.symbols = dict()
+
+    def read_object(self, path: str) -> dict:
+        with open(path, encoding="utf-8") as f:
+            return json.loads(f.read())
+
+    def link(self) -> None:
+        bases = self.place_sections()
+        self.collect_symbols(bases)
+        for obj, base in zip(self.objects, bases):
+            self.relocate(obj, base)
+
+    def place_sections(self) -> list[dict]:
+        # Start of text and data of every module in the image
+        bases = []
+        for obj in self.objects:
+            bases.append({"text": len(self.text), "data": len(self.data)})
+            self.text.extend(dict(instr) for instr in obj["text"])
+            self.data.extend(dict(cell) for cell in obj["data"])
+        return bases
+
+    def collect_symbols(self, bases: list[dict]) -> None:
+        for obj, base in zip(self.objects, bases):
+            for name, symbol in obj["exports"].items():
+                if name in self.symbols:
+                    # The symbol is exported by two modules
+                    raise KeyError(name)
+                self.symbols[name] = base[symbol["section"]] + symbol["pos"]
+
+    def relocate(self, obj: dict, base: dict) -> None:
+        for relocation in obj["relocations"]:
+            if "symbol" in relocation:
+                name = relocation["symbol"]
+                if name not in self.symbols:
+                    # Undefined external symbol
+                    raise KeyError(name)
+                address = self.symbols[name]
+            else:
+                address = None
+            if relocation["section"] == "text":
+                instr = self.text[base["text"] + relocation["pos"]]
+                instr["arg"] = self.shift(instr["arg"], address, base, relocation)
+            else:
+                cell = self.data[base["data"] + relocation["pos"]]
+                cell["val"] = self.shift(cell["val"], address, base, relocation)
+
+    def shift(self, val, address, base: dict, relocation: dict) -> str:
+        if address is not None:
+            return f"{address}"
+        return f"{int(val) + base[relocation['target']]}"
+
+    def write(self, out_instructions_file_name: str, out_data_file_name: str) -> None:
+        write_code(self.text, out_instructions_file_name)
+        write_code(self.data, out_data_file_name)
+
+
+def main(out_instr: str, out_data: str, object_files: list[str]) -> None:
+    linker = Linker(object_files)
+    linker.link()
+    linker.write(out_instr, out_data)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "inputs",
+        metavar="INPUT",
+        nargs="*",
+        help="<file for encoded instructions> <file for encoded data> <object file>...",
+    )
+    args = parser.parse_args().inputs
+    assert len(args) > 2, "The number of arguments have to be at least 3"
+    main(args[0], args[1], args[2:])
@@ -7,12 +7,36 @@ from typing import Optional
 import yaml
 
 from isa import DataType, Opcode, encode_data, load_code_data
-
-instructions = {Opcode.add, Opcode.cmp, Opcode.load, Opcode.mod, Opcode.di, Opcode.ei, Opcode.hlt, Opcode.store}
+from tracer import TraceRecorder
+
+arithmetic_ops = {
+    Opcode.add,
+    Opcode.sub,
+    Opcode.mod,
+    Opcode.mul,
+    Opcode.div,
+    Opcode.shl,
+    Opcode.shr,
+    Opcode.and_,
+    Opcode.or_,
+}
+instructions = {Opcode.cmp, Opcode.load, Opcode.di, Opcode.ei, Opcode.hlt, Opcode.store} | arithmetic_ops
 control_flow = {Opcode.jmp, Opcode.jnz, Opcode.jz, Opcode.jn, Opcode.jnn}
-arithmetic_ops = {Opcode.add, Opcode.sub, Opcode.mod}
-address_instructions = {Opcode.add, Opcode.cmp, Opcode.load, Opcode.mod, Opcode.store}
-stack_instructions = {Opcode.push, Opcode.pop, Opcode.iret}
+# Instructions for programs running on several cores
+core_instructions = {Opcode.cid, Opcode.ncores, Opcode.tas}
+address_instructions = {Opcode.cmp, Opcode.load, Opcode.store, Opcode.tas} | arithmetic_ops
+stack_instructions = {Opcode.push, Opcode.pop, Opcode.iret, Opcode.call, Opcode.ret}
+# Instructions whose argument is an address in instruction memory
+jump_instructions = control_flow | {Opcode.call}
+
+# Буфер ввода занимает ячейки 1998 - 2037, стек основной программы - 2038 - 2047
+input_buffer_start = 1998
+# Machine word is a signed 32-bit integer
+word_size = 32
+stack_size = 10
+# Регистры DMA-контроллера вывода: длина блока(0 - до нулевого символа) и адрес источника, запись адреса запускает пересылку
+dma_length_register = 1996
+dma_source_register = 1997
 
 """
 logger = logging.getLogger(__name__)
@@ -69,6 +93,103 @@ class ExternalDevice:
         self.output_data.append(num)
         logging.debug(f"INT_OUT: {num}")
 
+    def read_block(self, block: list):
+        out = [chr(int(cell["val"])) if cell["type"] == DataType.char else cell["val"] for cell in block]
+        self.output_data.extend(out)
+        logging.debug(f"BLOCK_OUT: {''.join(str(x) for x in out)}")
+
+
+class BlockOutputDevice:
+    """DMA-контроллер: пересылает блок из памяти данных в устройство вывода одной пачкой"""
+
+    length: int
+    busy: int
+
+    def __init__(self) -> None:
+        self.length = 0
+        self.busy = 0
+
+    def cell_at(self, data_mem: list, address: int) -> dict:
+        cell = data_mem[address]
+        # Cells which were never written hold 0
+        return cell if isinstance(cell, dict) else encode_data("empty", 0, DataType.num)
+
+    def transfer(self, src: int, data_mem: list, sink: ExternalDevice):
+        if not 0 <= src < len(data_mem):
+            raise ValueError("src")
+        if self.length == 0:
+            end = src
+            while end < len(data_mem) and int(self.cell_at(data_mem, end)["val"]) != 0:
+                end += 1
+            # Terminating null is read too, but not sent, the scan stops at the end of memory
+            reads = min(end - src + 1, len(data_mem) - src)
+        else:
+            end = min(src + self.length, len(data_mem))
+            reads = end - src
+        sink.read_block([self.cell_at(data_mem, address) for address in range(src, end)])
+        # One tick per read of data memory
+        self.busy = reads
+
+
+class Task:
+    """Программа, выполняемая в режиме разделения времени, и её сохранённый контекст"""
+
+    name: str
+    entry: int
+    pc: int
+    acc: dict
+    sp: int
+    zero_flag: bool
+    negative_flag: bool
+    ei: bool
+    dma_length: int
+    out_dev: ExternalDevice
+
+    halted: bool
+    ticks: int
+    instructions: int
+    finished_at: Optional[int]
+
+    def __init__(self, name: str, entry: int, sp: int) -> None:
+        self.name = name
+        self.entry = entry
+        self.pc = entry
+        self.acc = encode_data("empty acc", 0, DataType.num)
+        self.sp = sp
+        self.zero_flag = False
+        self.negative_flag = False
+        self.ei = True
+        self.dma_length = 0
+        self.out_dev = ExternalDevice()
+        self.halted = False
+        self.ticks = 0
+        self.instructions = 0
+        self.finished_at = None
+
+    def throughput(self) -> float:
+        if self.ticks == 0:
+            return 0.0
+        return self.instructions / self.ticks
+
+
+def stack_top(number: int) -> int:
+    """Начальное значение SP для программы с номером number.
+
+    Первая программа использует стек 2038 - 2047, стеки остальных располагаются под регистрами DMA.
+    """
+    if number == 0:
+        return 2048
+    return dma_length_register - (number - 1) * stack_size
+
+
+def check_stack_overlap(datapath: "DataPath", stacks: int, name: str):
+    """Загруженные данные не должны доходить до стеков stacks программ(ядер)"""
+    # Stacks grow down to this cell, program data must end below it
+    stack_bottom = min(stack_top(stacks - 1) - stack_size, dma_length_register)
+    if datapath.data_empty_cell > stack_bottom:
+        logging.error(f"{name}: data ends at {datapath.data_empty_cell}, stacks start at {stack_bottom}")
+        raise MemoryError
+
 
 class ALU:
     operation_res: Optional[int]
@@ -85,17 +206,27 @@ class ALU:
         self.negative_flag = False
 
     def do_arithmetic(self, opcode: Opcode):
-        if opcode is Opcode.add:
-            self.add_op()
-        elif opcode is Opcode.sub:
-            self.sub_op()
-        elif opcode is Opcode.mod:
-            self.mod_op()
-        elif opcode is Opcode.cmp:
-            self.sub_op()
+        {
+            Opcode.add: self.add_op,
+            Opcode.sub: self.sub_op,
+            Opcode.mod: self.mod_op,
+            Opcode.mul: self.mul_op,
+            Opcode.div: self.div_op,
+            Opcode.shl: self.shl_op,
+            Opcode.shr: self.shr_op,
+            Opcode.and_: self.and_op,
+            Opcode.or_: self.or_op,
+            Opcode.cmp: self.sub_op,
+            Opcode.tas: self.pass_op,
+        }[opcode]()
+        self.wrap_result()
         self.check_if_zero()
         self.check_if_negative()
 
+    def wrap_result(self):
+        # Result is truncated to the machine word, the sign is taken from its highest bit
+        self.operation_res = (self.operation_res + 2 ** (word_size - 1)) % 2**word_size - 2 ** (word_size - 1)
+
     def check_if_zero(self):
         if self.operation_res == 0:
             self.zero_flag = True
@@ -108,6 +239,9 @@ class ALU:
         else:
             self.negative_flag = False
 
+    def pass_op(self):
+        self.operation_res = self.left_in
+
     def add_op(self):
         self.operation_res = self.left_in + self.right_in
 
@@ -117,6 +251,27 @@ class ALU:
     def mod_op(self):
         self.operation_res = self.left_in % self.right_in
 
+    def mul_op(self):
+        self.operation_res = self.left_in * self.right_in
+
+    def div_op(self):
+        # Rounds towards negative infinity, so that div and mod agree: a == (a div b) * b + (a mod b)
+        self.operation_res = self.left_in // self.right_in
+
+    def shl_op(self):
+        # Only the low bits of the shift count are used, as in a barrel shifter
+        self.operation_res = self.left_in << (self.right_in % word_size)
+
+    def shr_op(self):
+        # Arithmetic shift, the sign is kept
+        self.operation_res = self.left_in >> (self.right_in % word_size)
+
+    def and_op(self):
+        self.operation_res = self.left_in & self.right_in
+
+    def or_op(self):
+        self.operation_res = self.left_in | self.right_in
+
 
 class DataPath:
     pc: int
@@ -132,6 +287,12 @@ class DataPath:
 
     in_dev: ExternalDevice
     out_dev: ExternalDevice
+    dma: BlockOutputDevice
+    # Core-ID and Core-Count registers of the multicore model
+    core_id: int
+    core_count: int
+    # Address and value of the last data memory write, for the execution trace
+    last_write: Optional[tuple[int, int]]
 
     def __init__(
         self,
@@ -142,11 +303,7 @@ class DataPath:
         output_device: ExternalDevice,
     ) -> None:
         # Sp points to 2048, because initially in stack no data
-        self.sp = 2048
-        self.acc = encode_data("empty acc", 0, DataType.num)
-        self.ar = 0
-        self.ir = 0
-        self.dr = 0
+        self.init_registers(2048)
         self.inst_mem = [0] * (2**11)
         self.data_mem = [0] * (2**11)
         self.inst_mem[2] = start_cell_isr
@@ -158,9 +315,23 @@ class DataPath:
         # В instr_empty_cell запишется первая инструкция основной программы
         self.pc = self.instr_empty_cell
 
-        self.alu = ALU()
         self.in_dev = input_device
         self.out_dev = output_device
+        self.dma = BlockOutputDevice()
+        # Core-count register, the same for all cores
+        self.core_count = 1
+
+    def init_registers(self, sp: int):
+        """Регистры и АЛУ процессора, у каждого ядра многоядерной модели свои"""
+        self.sp = sp
+        self.acc = encode_data("empty acc", 0, DataType.num)
+        self.ar = 0
+        self.ir = 0
+        self.dr = 0
+        self.alu = ALU()
+        # Core-ID register, the only core of a single-core machine has number 0
+        self.core_id = 0
+        self.last_write = None
 
     def load_program_in_mem(self, instr: list, data: list):
         counter = 0
@@ -175,10 +346,13 @@ class DataPath:
         self.data_empty_cell = self.data_empty_cell + counter
         counter = 0
         for i in range(instr_offset, instr_offset + len(instr)):
-            if instr[counter]["opcode"] in {Opcode.add, Opcode.sub, Opcode.cmp, Opcode.load, Opcode.store, Opcode.mod}:
+            if instr[counter]["immediate"]:
+                # Immediate operand is a value, not an address, so it is never relocated
+                pass
+            elif instr[counter]["opcode"] in address_instructions:
                 # Из-за того, что адреса ячеек данные смещены, т.к в памяти данных уже имеются другие значения
                 instr[counter]["arg"] += d_offset
-            elif instr[counter]["opcode"] in {Opcode.jmp, Opcode.jnz, Opcode.jz, Opcode.jn, Opcode.jnn}:
+            elif instr[counter]["opcode"] in jump_instructions:
                 # Инструкции тоже смещены, если загружаемая программа загружается не первой.
                 instr[counter]["arg"] += instr_offset
             self.inst_mem[i] = instr[counter]
@@ -186,9 +360,9 @@ class DataPath:
         self.instr_empty_cell = self.instr_empty_cell + counter
 
     def latch_pc(self, sel: Opcode, arg: Optional[int] = None):
-        if (sel not in control_flow) and (sel is not Opcode.iret):
+        if (sel not in jump_instructions) and (sel not in {Opcode.iret, Opcode.ret}):
             self.pc += 1
-        elif sel is Opcode.iret:
+        elif sel in {Opcode.iret, Opcode.ret}:
             self.pc = int(self.dr["val"])
         else:
             self.pc = arg
@@ -206,25 +380,46 @@ class DataPath:
     def latch_acc(self, sel):
         if sel is Opcode.interrupt:
             self.acc = encode_data("saved_pc", self.pc, DataType.num)
-        elif sel in {Opcode.load, Opcode.pop}:
+        elif sel in {Opcode.load, Opcode.pop, Opcode.tas}:
             self.acc = self.dr
+        elif sel is Opcode.cid:
+            self.acc = encode_data("core id", self.core_id, DataType.num)
+        elif sel is Opcode.ncores:
+            self.acc = encode_data("core count", self.core_count, DataType.num)
         elif sel in arithmetic_ops:
             self.acc = encode_data(f"{sel} operation res", self.alu.operation_res, DataType.num)
 
     def latch_sp(self, sel):
-        if sel in {Opcode.push, Opcode.interrupt}:
+        if sel in {Opcode.push, Opcode.interrupt, Opcode.call}:
             # Stack grows up that's why we need to decrement it, the newest value will have the lowest address in stack
             # 2045: newest val  ^
             # 2046:             |
             # 2047: oldest val  |
             self.sp -= 1
-        elif sel in {Opcode.pop, Opcode.iret}:
+        elif sel in {Opcode.pop, Opcode.iret, Opcode.ret}:
             self.sp += 1
 
     def latch_alu(self):
         self.alu.left_in = int(self.acc["val"])
         self.alu.right_in = int(self.dr["val"])
 
+    def write_return_address(self):
+        """call сохраняет на стек адрес следующей инструкции, ACC не меняется"""
+        self.last_write = (self.ar, self.pc + 1)
+        self.data_mem[self.ar] = encode_data("return address", self.pc + 1, DataType.num)
+
+    def read_lock(self):
+        """Первая половина test-and-set: чтение ячейки по AR"""
+        self.read_from_mem(MemType.data_mem)
+
+    def write_lock(self):
+        """Вторая половина test-and-set: в ячейку по AR записывается 1"""
+        self.last_write = (self.ar, 1)
+        self.data_mem[self.ar] = encode_data("lock", 1, DataType.num)
+
+    def latch_dr_immediate(self):
+        self.dr = encode_data("immediate", self.ir["arg"], DataType.num)
+
     def read_from_mem(self, mem_type):
         if mem_type is MemType.instruction_mem:
             self.ir = self.inst_mem[self.pc]
@@ -235,11 +430,16 @@ class DataPath:
                 self.dr = self.data_mem[self.ar]
 
     def write_to_data_mem(self):
+        self.last_write = (self.ar, int(self.acc["val"]))
         if self.ar == 1:
             if self.acc["type"] == DataType.char:
                 self.out_dev.read_char(self.acc["val"])
             elif self.acc["type"] == DataType.num:
                 self.out_dev.read_int(self.acc["val"])
+        elif self.ar == dma_length_register:
+            self.dma.length = int(self.acc["val"])
+        elif self.ar == dma_source_register:
+            self.dma.transfer(int(self.acc["val"]), self.data_mem, self.out_dev)
         else:
             self.data_mem[self.ar] = self.acc
 
@@ -250,32 +450,48 @@ class ControUnit:
 
     ei: bool
     interrupt: bool
+    isr_active: bool
     _tick: int
+    trace: Optional[TraceRecorder]
 
-    def __init__(self, input_device, datapath) -> None:
+    def __init__(self, input_device, datapath, trace: Optional[TraceRecorder] = None) -> None:
         self.input_device = input_device
         self.datapath = datapath
         self._tick = 0
         self.ei = True
         self.interrupt = False
+        self.isr_active = False
+        self.trace = trace
 
     def execute(self):
+        start_tick = self._tick
+        start_pc = self.datapath.pc
+        self.datapath.last_write = None
         # The first stage: instruction fetch(inst_mem[pc] -> ir)
         self.datapath.read_from_mem(MemType.instruction_mem)
         cur_inst = self.datapath.ir["opcode"]
         arg = self.datapath.ir["arg"]
         ad_type = self.datapath.ir["address_type"]
+        immediate = self.datapath.ir["immediate"]
         self.tick()
         # Decode and execution stage
-        if cur_inst in instructions:
-            self.execute_basic_instructions(cur_inst, ad_type)
-            self.datapath.latch_pc(cur_inst)
-        elif cur_inst in control_flow:
-            self.execute_control_flow_instruction(cur_inst, arg)
-        elif cur_inst in stack_instructions:
-            self.excute_stack_instructions(cur_inst)
-            if cur_inst is not Opcode.iret:
+        try:
+            if cur_inst in instructions:
+                self.execute_basic_instructions(cur_inst, ad_type, immediate)
                 self.datapath.latch_pc(cur_inst)
+            elif cur_inst in core_instructions:
+                self.execute_core_instructions(cur_inst, ad_type)
+                self.datapath.latch_pc(cur_inst)
+            elif cur_inst in control_flow:
+                self.execute_control_flow_instruction(cur_inst, arg)
+            elif cur_inst in stack_instructions:
+                self.excute_stack_instructions(cur_inst, arg)
+                if cur_inst not in {Opcode.iret, Opcode.call, Opcode.ret}:
+                    self.datapath.latch_pc(cur_inst)
+        finally:
+            # hlt stops the simulation with SystemExit, it is recorded as well
+            if self.trace is not None:
+                self.trace.record(start_tick, start_pc, self)
         # Check for interrupt request
         self.check_for_interrupt()
 
@@ -315,7 +531,22 @@ class ControUnit:
                 self.datapath.latch_pc(Opcode.add)
             self.tick()
 
-    def excute_stack_instructions(self, instr):
+    def execute_core_instructions(self, instr, ad_type):
+        if instr in {Opcode.cid, Opcode.ncores}:
+            self.datapath.latch_acc(instr)
+            self.tick()
+        elif instr is Opcode.tas:
+            # Old value goes to ACC, Z flag is raised if the lock was free, then 1 is written to the cell
+            self.load_operand_address(instr, ad_type, False)
+            self.datapath.read_lock()
+            self.datapath.latch_acc(instr)
+            self.tick()
+            self.datapath.latch_alu()
+            self.datapath.alu.do_arithmetic(instr)
+            self.datapath.write_lock()
+            self.tick()
+
+    def excute_stack_instructions(self, instr, arg=None):
         if instr is Opcode.pop:
             self.datapath.latch_ar(instr)
             self.tick()
@@ -342,33 +573,46 @@ class ControUnit:
             self.datapath.latch_pc(instr)
             self.ei = True
             self.interrupt = False
+            self.isr_active = False
             self.tick()
             logging.debug("-----------Interrupt-Ended-----------")
-
-    def execute_basic_instructions(self, instr, ad_type):
-        # ad_type == True => indirect address
-        if ad_type is True:
-            self.load_indirect_address(instr)
-        else:
+        elif instr is Opcode.call:
+            # Return address is pushed on the stack, ACC is kept to pass an argument to the routine
+            self.datapath.latch_sp(instr)
+            self.datapath.latch_ar(instr)
+            self.datapath.write_return_address()
+            self.tick()
+            self.datapath.latch_pc(instr, arg)
+            self.tick()
+        elif instr is Opcode.ret:
             self.datapath.latch_ar(instr)
             self.tick()
+            self.datapath.read_from_mem(MemType.data_mem)
+            self.datapath.latch_sp(instr)
+            self.tick()
+            self.datapath.latch_pc(instr)
+            self.tick()
+
+    def execute_basic_instructions(self, instr, ad_type, immediate=False):
+        self.load_operand_address(instr, ad_type, immediate)
 
         if instr is Opcode.load:
-            self.datapath.read_from_mem(MemType.data_mem)
+            self.fetch_operand(immediate)
             self.datapath.latch_acc(instr)
             self.tick()
         elif instr is Opcode.store:
             self.datapath.write_to_data_mem()
             self.tick()
+            self.wait_for_dma()
         elif instr in arithmetic_ops:
-            self.datapath.read_from_mem(MemType.data_mem)
+            self.fetch_operand(immediate)
             self.datapath.latch_alu()
             self.tick()
             self.datapath.alu.do_arithmetic(instr)
             self.datapath.latch_acc(instr)
             self.tick()
         elif instr is Opcode.cmp:
-            self.datapath.read_from_mem(MemType.data_mem)
+            self.fetch_operand(immediate)
             self.datapath.latch_alu()
             self.tick()
             self.datapath.alu.do_arithmetic(instr)
@@ -382,6 +626,30 @@ class ControUnit:
         elif instr is Opcode.hlt:
             raise SystemExit
 
+    def wait_for_dma(self):
+        # Data memory is single-ported, so the processor is stalled while DMA reads the block
+        while self.datapath.dma.busy > 0:
+            self.datapath.dma.busy -= 1
+            self.tick()
+
+    def load_operand_address(self, instr, ad_type, immediate):
+        # Immediate operand is already in IR, AR is not needed
+        if immediate:
+            return
+        # ad_type == True => indirect address
+        if ad_type is True:
+            self.load_indirect_address(instr)
+        else:
+            self.datapath.latch_ar(instr)
+            self.tick()
+
+    def fetch_operand(self, immediate):
+        """Загрузить операнд в DR: из IR при непосредственной адресации, иначе из памяти данных по AR"""
+        if immediate:
+            self.datapath.latch_dr_immediate()
+        else:
+            self.datapath.read_from_mem(MemType.data_mem)
+
     def load_indirect_address(self, instr):
         """Загрузить в AR косвенный адрес, после завершиния функции в AR лежит нужный адрес"""
         self.datapath.latch_ar(instr)
@@ -399,6 +667,7 @@ class ControUnit:
 
     def do_interrupt(self):
         self.ei = False
+        self.isr_active = True
         logging.debug("EI switched to False")
         self.save_context()
         self.find_isr()
@@ -437,6 +706,33 @@ class ControUnit:
         logging.debug(f"find_isr: ar:{self.datapath.ar} mem[ar]:{self.datapath.data_mem[self.datapath.ar]}")
         logging.debug("-----------Execute-ISR-----------")
 
+    def save_task(self, task: Task):
+        """Первая половина переключения контекста: PC, ACC, SP, флаги и длина блока DMA сохраняются в блок управления задачей"""
+        task.pc = self.datapath.pc
+        self.tick()
+        task.acc = self.datapath.acc
+        self.tick()
+        task.sp = self.datapath.sp
+        task.zero_flag = self.datapath.alu.zero_flag
+        task.negative_flag = self.datapath.alu.negative_flag
+        task.ei = self.ei
+        task.dma_length = self.datapath.dma.length
+        self.tick()
+
+    def restore_task(self, task: Task):
+        """Вторая половина переключения контекста: регистры загружаются из блока управления задачей"""
+        self.datapath.sp = task.sp
+        self.datapath.alu.zero_flag = task.zero_flag
+        self.datapath.alu.negative_flag = task.negative_flag
+        self.ei = task.ei
+        self.datapath.dma.length = task.dma_length
+        self.tick()
+        self.datapath.acc = task.acc
+        self.tick()
+        self.datapath.pc = task.pc
+        self.datapath.out_dev = task.out_dev
+        self.tick()
+
     def tick(self):
         self._tick += 1
 
@@ -445,19 +741,134 @@ class ControUnit:
             self._tick, self.datapath.pc, self.datapath.ar, self.datapath.acc["val"], self.ei, self.interrupt
         )
         cur_instr = self.datapath.inst_mem[self.datapath.pc]
-        opcode = cur_instr["opcode"].name
+        opcode = cur_instr["opcode"].value
         arg = cur_instr["arg"]
-        if (arg is not None) and (opcode not in {"jmp", "jz", "jnz", "jn", "jnn"}):
+        if (arg is not None) and (cur_instr["opcode"] not in jump_instructions) and not cur_instr["immediate"]:
             arg_in_data_mem = self.datapath.data_mem[arg]
         else:
             arg_in_data_mem = "null"
         if arg is None:
             arg = "null"
+        elif cur_instr["immediate"]:
+            arg = f"#{arg}"
         instr_repr = "Opcode:{} Arg:{} Mem[arg]:{}".format(opcode, arg, arg_in_data_mem)
         return "{} \t{}".format(state_repr, instr_repr)
 
 
-def simulation(limit: int, inst_mem: list, data_mem: list, inst_isr, data_isr, input_data: list):
+class Scheduler:
+    """Вытесняющий планировщик: по прерыванию таймера раз в quantum тактов переключает задачи по кругу"""
+
+    tasks: list[Task]
+    quantum: int
+    controlunit: ControUnit
+    current: Optional[Task]
+    slice_start: int
+    switches: int
+    switch_ticks: int
+
+    def __init__(self, tasks: list[Task], quantum: int, controlunit: ControUnit) -> None:
+        self.tasks = tasks
+        self.quantum = quantum
+        self.controlunit = controlunit
+        self.current = None
+        self.slice_start = 0
+        self.switches = 0
+        self.switch_ticks = 0
+        self.dispatch(tasks[0])
+
+    def next_task(self) -> Optional[Task]:
+        start = self.tasks.index(self.current)
+        for i in range(1, len(self.tasks) + 1):
+            task = self.tasks[(start + i) % len(self.tasks)]
+            if not task.halted:
+                return task
+        return None
+
+    def dispatch(self, task: Task):
+        start = self.controlunit._tick
+        self.controlunit.restore_task(task)
+        self.switch_ticks += self.controlunit._tick - start
+        self.current = task
+        self.slice_start = self.controlunit._tick
+
+    def account(self):
+        self.current.ticks += self.controlunit._tick - self.slice_start
+
+    def timer_expired(self) -> bool:
+        # The timer interrupt is not taken while ISR is running, otherwise the ISR context would be lost
+        return (self.controlunit._tick - self.slice_start >= self.quantum) and not self.controlunit.isr_active
+
+    def preempt(self):
+        self.account()
+        nxt = self.next_task()
+        if nxt is self.current:
+            # The only runnable task keeps the processor, the timer is simply restarted
+            self.slice_start = self.controlunit._tick
+            return
+        logging.debug(f"-----------Context-Switch-{self.current.name}-{nxt.name}-----------")
+        start = self.controlunit._tick
+        self.controlunit.save_task(self.current)
+        self.switch_ticks += self.controlunit._tick - start
+        self.switches += 1
+        self.dispatch(nxt)
+
+    def halt_current(self):
+        self.account()
+        self.current.halted = True
+        self.current.finished_at = self.controlunit._tick
+        logging.debug(f"{self.current.name} stopted by HLT command at tick: {self.controlunit._tick}")
+        nxt = self.next_task()
+        if nxt is None:
+            self.current = None
+            return
+        logging.debug(f"-----------Context-Switch-{self.current.name}-{nxt.name}-----------")
+        self.switches += 1
+        self.dispatch(nxt)
+
+    def step(self):
+        try:
+            self.controlunit.execute()
+        except SystemExit:
+            self.current.instructions += 1
+            self.halt_current()
+            return
+        self.current.instructions += 1
+        if self.timer_expired():
+            self.preempt()
+
+    def report(self) -> list[str]:
+        lines = []
+        total_instructions = 0
+        for task in self.tasks:
+            total_instructions += task.instructions
+            lines.append(
+                "{}: instructions:{} ticks:{} finished_at:{} throughput:{:.3f}".format(
+                    task.name, task.instructions, task.ticks, task.finished_at, task.throughput()
+                )
+            )
+        total_ticks = self.controlunit._tick
+        lines.append(
+            "total: instructions:{} ticks:{} throughput:{:.3f} switches:{} switch_ticks:{} overhead:{:.2%}".format(
+                total_instructions,
+                total_ticks,
+                total_instructions / total_ticks if total_ticks else 0.0,
+                self.switches,
+                self.switch_ticks,
+                self.switch_ticks / total_ticks if total_ticks else 0.0,
+            )
+        )
+        return lines
+
+
+def simulation(
+    limit: int,
+    inst_mem: list,
+    data_mem: list,
+    inst_isr,
+    data_isr,
+    input_data: list,
+    trace: Optional[TraceRecorder] = None,
+):
     in_d: deque = deque(input_data)
     in_dev = ExternalDevice(input_data=in_d)
     out_dev = ExternalDevice()
@@ -465,7 +876,7 @@ def simulation(limit: int, inst_mem: list, data_mem: list, inst_isr, data_isr, i
         start_cell_isr=0, isr_prog=inst_isr, isr_data=data_isr, input_device=in_dev, output_device=out_dev
     )
     datapath.load_program_in_mem(inst_mem, data_mem)
-    controlunit = ControUnit(input_device=in_dev, datapath=datapath)
+    controlunit = ControUnit(input_device=in_dev, datapath=datapath, trace=trace)
     try:
         c = 0
         while c < limit:
@@ -484,7 +895,52 @@ def simulation(limit: int, inst_mem: list, data_mem: list, inst_isr, data_isr, i
         return
 
 
-def main(instr_f: str, data_f: str, input_f: str):
+def multiprogram_simulation(
+    limit: int,
+    programs: list[tuple[list, list]],
+    inst_isr,
+    data_isr,
+    input_data: list,
+    quantum: int,
+    trace: Optional[TraceRecorder] = None,
+):
+    if quantum < 1:
+        # Otherwise the timer would switch tasks after every instruction
+        raise ValueError("quantum")
+    if not programs:
+        raise ValueError("programs")
+    in_d: deque = deque(input_data)
+    in_dev = ExternalDevice(input_data=in_d)
+    datapath = DataPath(
+        start_cell_isr=0, isr_prog=inst_isr, isr_data=data_isr, input_device=in_dev, output_device=ExternalDevice()
+    )
+    tasks = []
+    for number, (inst_mem, data_mem) in enumerate(programs):
+        tasks.append(Task(f"task{number}", datapath.instr_empty_cell, stack_top(number)))
+        datapath.load_program_in_mem(inst_mem, data_mem)
+        check_stack_overlap(datapath, len(programs), f"task{number}")
+    controlunit = ControUnit(input_device=in_dev, datapath=datapath, trace=trace)
+    scheduler = Scheduler(tasks, quantum, controlunit)
+    try:
+        c = 0
+        while c < limit and scheduler.current is not None:
+            logging.debug("%s", controlunit)
+            if len(in_dev.in_data) != 0:
+                if in_dev.get_cur_char()[0] <= c:
+                    controlunit.interrupt = True
+            scheduler.step()
+            c += 1
+    except BufferError:
+        logging.debug("Input buffer is empty")
+        return
+    logging.debug(f"Simulation stopted Total ticks: {controlunit._tick}")
+    for task in tasks:
+        print(f"{task.name}:", *task.out_dev.output_data)
+    for line in scheduler.report():
+        print(line)
+
+
+def main(instr_f: str, data_f: str, input_f: str, trace_f: Optional[str] = None, limit: int = 100000):
     inst_p, data_p = load_code_data(instr_f, data_f)
 
     inst_isr, data_isr = load_code_data("static/isr/instr.json", "static/isr/data.json")
@@ -492,11 +948,44 @@ def main(instr_f: str, data_f: str, input_f: str):
     with open(input_f, encoding="utf-8") as f:
         ym = yaml.safe_load(f.read())
     data = ym
-    simulation(limit=100000, inst_mem=inst_p, data_mem=data_p, inst_isr=inst_isr, data_isr=data_isr, input_data=data)
+    trace = TraceRecorder(trace_f) if trace_f is not None else None
+    simulation(
+        limit=limit,
+        inst_mem=inst_p,
+        data_mem=data_p,
+        inst_isr=inst_isr,
+        data_isr=data_isr,
+        input_data=data,
+        trace=trace,
+    )
+    if trace is not None:
+        trace.save()
+
+
+def multiprogram_main(
+    programs: list[tuple[str, str]], input_f: str, quantum: int, trace_f: Optional[str] = None, limit: int = 100000
+):
+    progs = [load_code_data(instr_f, data_f) for instr_f, data_f in programs]
+
+    inst_isr, data_isr = load_code_data("static/isr/instr.json", "static/isr/data.json")
+
+    with open(input_f, encoding="utf-8") as f:
+        data = yaml.safe_load(f.read())
+    trace = TraceRecorder(trace_f) if trace_f is not None else None
+    multiprogram_simulation(
+        limit=limit,
+        programs=progs,
+        inst_isr=inst_isr,
+        data_isr=data_isr,
+        input_data=data,
+        quantum=quantum,
+        trace=trace,
+    )
+    if trace is not None:
+        trace.save()
 
 
 if __name__ == "__main__":
-    logging.getLogger().setLevel(logging.DEBUG)
     parser = argparse.ArgumentParser()
     parser.add_argument(
         "inputs",
@@ -504,6 +993,22 @@ if __name__ == "__main__":
         nargs="*",
         help="<path to file with instruction memory> <path to file with data memory> <path to input file>",
     )
-    args: list[str] = parser.parse_args().inputs
-    assert len(args) == 3, "There should be two arguments"
-    main(args[0], args[1], args[2])
+    parser.add_argument(
+        "--quantum",
+        type=int,
+        help="time slice in ticks, runs several programs: <path to input file> <instr 1> <data 1> [<instr 2> <data 2>...]",
+    )
+    parser.add_argument("--trace", help="write per-instruction trace to .npz file instead of the debug log")
+    parser.add_argument("--limit", type=int, default=100000, help="maximum number of instructions to simulate")
+    namespace = parser.parse_args()
+    args: list[str] = namespace.inputs
+    if namespace.trace is None:
+        logging.getLogger().setLevel(logging.DEBUG)
+    if namespace.quantum is not None:
+        assert len(args) % 2 == 1, "There should be input file and pairs of instr/data files"
+        multiprogram_main(
+            list(zip(args[1::2], args[2::2])), args[0], namespace.quantum, namespace.trace, namespace.limit
+        )
+    else:
+        assert len(args) == 3, "There should be two arguments"
+        main(args[0], args[1], args[2], namespace.trace, namespace.limit)
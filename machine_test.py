@@ -0,0 +1,87 @@
+import pytest
+
+import machine
+from isa import DataType, Opcode
+
+
+def program(data_cells: int) -> tuple[list, list]:
+    instr = [{"opcode": Opcode.hlt, "arg": None, "address_type": False, "immediate": False}]
+    data = [{"name": f"x{i}", "type": DataType.num, "val": "0", "l2l": False} for i in range(data_cells)]
+    return instr, data
+
+
+def test_task_stack_overlapping_data_is_rejected():
+    with pytest.raises(MemoryError):
+        machine.multiprogram_simulation(
+            limit=10, programs=[program(1000), program(1000)], inst_isr=[], data_isr=[], input_data=[], quantum=10
+        )
+
+
+@pytest.mark.parametrize(
+    ("opcode", "left", "right", "result"),
+    [
+        (Opcode.shl, 1, 70, 1 << 6),
+        (Opcode.shl, 1, 31, -(2**31)),
+        (Opcode.mul, 2**16, 2**16, 0),
+        (Opcode.add, 2**31 - 1, 1, -(2**31)),
+        (Opcode.sub, -(2**31), 1, 2**31 - 1),
+        (Opcode.shr, -8, 33, -4),
+    ],
+)
+def test_alu_result_is_signed_32_bit(opcode, left, right, result):
+    alu = machine.ALU()
+    alu.left_in = left
+    alu.right_in = right
+    alu.do_arithmetic(opcode)
+    assert alu.operation_res == result
+
+
+def test_dma_reads_unwritten_cells_as_zero():
+    data_mem = [0] * 2**11
+    data_mem[10] = {"name": "h", "type": DataType.char, "val": ord("h"), "l2l": False}
+    sink = machine.ExternalDevice()
+    dma = machine.BlockOutputDevice()
+    dma.length = 3
+    dma.transfer(10, data_mem, sink)
+    assert sink.output_data == ["h", "0", "0"]
+    assert dma.busy == 3
+
+
+def test_dma_scan_stops_at_the_end_of_memory():
+    data_mem = [0] * 2**11
+    data_mem[-2:] = [{"name": c, "type": DataType.char, "val": ord(c), "l2l": False} for c in "ab"]
+    sink = machine.ExternalDevice()
+    dma = machine.BlockOutputDevice()
+    dma.transfer(2**11 - 2, data_mem, sink)
+    assert sink.output_data == ["a", "b"]
+    assert dma.busy == 2
+
+
+def test_dma_length_is_part_of_task_context():
+    datapath = machine.DataPath(0, [], [], machine.ExternalDevice(), machine.ExternalDevice())
+    controlunit = machine.ControUnit(datapath.in_dev, datapath)
+    first, second = machine.Task("task0", 0, 2048), machine.Task("task1", 0, 1996)
+    datapath.dma.length = 5
+    controlunit.save_task(first)
+    controlunit.restore_task(second)
+    assert datapath.dma.length == 0
+    controlunit.restore_task(first)
+    assert datapath.dma.length == 5
+
+
+@pytest.mark.parametrize(
+    ("programs", "quantum", "error"),
+    [([program(1)], 0, "quantum"), ([program(1)], -3, "quantum"), ([], 10, "programs")],
+)
+def test_scheduler_parameters_are_validated(programs, quantum, error):
+    with pytest.raises(ValueError, match=error):
+        machine.multiprogram_simulation(
+            limit=10, programs=programs, inst_isr=[], data_isr=[], input_data=[], quantum=quantum
+        )
+
+
+@pytest.mark.parametrize("src", [-5, 2**11, 2**11 + 3])
+def test_dma_source_outside_memory_is_rejected(src):
+    dma = machine.BlockOutputDevice()
+    with pytest.raises(ValueError, match="src"):
+        dma.transfer(src, [0] * 2**11, machine.ExternalDevice())
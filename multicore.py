@@ -0,0 +1,231 @@
+import argparse
+import logging
+from collections import deque
+
+import yaml
+
+from isa import load_code_data
+from machine import ControUnit, DataPath, ExternalDevice, MemType, check_stack_overlap, stack_top
+
+
+class SharedMemoryArbiter:
+    """Арбитр единственного порта общей памяти данных.
+
+    Порт за такт обслуживает одно обращение, ядро ждёт первого свободного такта.
+    Занятые такты хранятся множеством, поэтому ядро, отставшее по времени, может занять такт раньше уже занятых.
+    """
+
+    reserved: set[int]
+    accesses: int
+    stall_ticks: int
+
+    def __init__(self) -> None:
+        self.reserved = set()
+        self.accesses = 0
+        self.stall_ticks = 0
+
+    def acquire(self, now: int, ticks: int = 1) -> int:
+        """Занять порт на ticks подряд идущих тактов не раньше now, вернуть кол-во тактов ожидания"""
+        start = now
+        while any(t in self.reserved for t in range(start, start + ticks)):
+            start += 1
+        self.reserved.update(range(start, start + ticks))
+        self.accesses += 1
+        self.stall_ticks += start - now
+        return start - now
+
+    def release_before(self, tick: int):
+        # No core will access memory earlier than the slowest core's tick
+        self.reserved = {t for t in self.reserved if t >= tick}
+
+
+class Core:
+    core_id: int
+    datapath: "CoreDataPath"
+    controlunit: "CoreControlUnit"
+    arbiter: SharedMemoryArbiter
+
+    halted: bool
+    instructions: int
+    stall_ticks: int
+
+    def __init__(self, core_id: int, image: DataPath, entry: int, arbiter: SharedMemoryArbiter) -> None:
+        self.core_id = core_id
+        self.arbiter = arbiter
+        self.datapath = CoreDataPath(self, image, entry)
+        self.controlunit = CoreControlUnit(self, image.in_dev, self.datapath)
+        self.halted = False
+        self.instructions = 0
+        self.stall_ticks = 0
+
+    def memory_access(self, ticks: int = 1):
+        stall = self.arbiter.acquire(self.controlunit._tick, ticks)
+        self.stall_ticks += stall
+        for _ in range(stall):
+            self.controlunit.tick()
+
+    def step(self):
+        try:
+            self.controlunit.execute()
+        except SystemExit:
+            self.halted = True
+            logging.debug(f"core{self.core_id} stopted by HLT command at tick: {self.controlunit._tick}")
+        self.instructions += 1
+
+
+class CoreDataPath(DataPath):
+    """DataPath ядра: свои регистры и АЛУ, память и устройства общие с остальными ядрами"""
+
+    core: Core
+
+    def __init__(self, core: Core, image: DataPath, entry: int) -> None:
+        self.core = core
+        # Memories, devices and DMA are taken from the loaded image and shared, registers are the core's own
+        vars(self).update(vars(image))
+        self.init_registers(stack_top(core.core_id))
+        self.core_id = core.core_id
+        self.pc = entry
+
+    def read_from_mem(self, mem_type):
+        # Instruction memory is separate and is not arbitrated
+        if mem_type is MemType.data_mem:
+            self.core.memory_access()
+        super().read_from_mem(mem_type)
+
+    def write_to_data_mem(self):
+        self.core.memory_access()
+        super().write_to_data_mem()
+
+    def write_return_address(self):
+        self.core.memory_access()
+        super().write_return_address()
+
+    def read_lock(self):
+        # Read and write of test-and-set are not separated by other cores' accesses, the port is taken for both
+        self.core.memory_access(2)
+        DataPath.read_from_mem(self, MemType.data_mem)
+
+
+class CoreControlUnit(ControUnit):
+    core: Core
+
+    def __init__(self, core: Core, input_device, datapath) -> None:
+        super().__init__(input_device, datapath)
+        self.core = core
+
+    def wait_for_dma(self):
+        # DMA reads the block through the same memory port
+        if self.datapath.dma.busy > 0:
+            stall = self.core.arbiter.acquire(self._tick, self.datapath.dma.busy)
+            self.core.stall_ticks += stall
+            for _ in range(stall):
+                self.tick()
+        super().wait_for_dma()
+
+    def __repr__(self) -> str:
+        return "core{} {}".format(self.core.core_id, super().__repr__())
+
+
+def report(cores: list[Core], arbiter: SharedMemoryArbiter) -> list[str]:
+    lines = []
+    for core in cores:
+        ticks = core.controlunit._tick
+        lines.append(
+            "core{}: instructions:{} ticks:{} stall_ticks:{} throughput:{:.3f}".format(
+                core.core_id, core.instructions, ticks, core.stall_ticks, core.instructions / ticks if ticks else 0.0
+            )
+        )
+    instructions = sum(core.instructions for core in cores)
+    ticks = max(core.controlunit._tick for core in cores)
+    busy = sum(core.controlunit._tick for core in cores)
+    lines.append(
+        "total: instructions:{} ticks:{} throughput:{:.3f} memory_accesses:{} stall_ticks:{} contention:{:.2%}".format(
+            instructions,
+            ticks,
+            instructions / ticks if ticks else 0.0,
+            arbiter.accesses,
+            arbiter.stall_ticks,
+            arbiter.stall_ticks / busy if busy else 0.0,
+        )
+    )
+    return lines
+
+
+def simulation(limit: int, inst_mem: list, data_mem: list, inst_isr, data_isr, input_data: list, cores: int):
+    if cores < 1:
+        raise ValueError("cores")
+    in_d: deque = deque(input_data)
+    in_dev = ExternalDevice(input_data=in_d)
+    out_dev = ExternalDevice()
+    image = DataPath(start_cell_isr=0, isr_prog=inst_isr, isr_data=data_isr, input_device=in_dev, output_device=out_dev)
+    entry = image.instr_empty_cell
+    image.load_program_in_mem(inst_mem, data_mem)
+    # Stacks of cores are placed as stacks of tasks
+    check_stack_overlap(image, cores, "program")
+    image.core_count = cores
+    arbiter = SharedMemoryArbiter()
+    running = [Core(core_id, image, entry, arbiter) for core_id in range(cores)]
+    all_cores = list(running)
+    try:
+        c = 0
+        while c < limit and running:
+            # Cores run in lockstep: the core which is behind in time executes the next instruction
+            core = min(running, key=lambda core: core.controlunit._tick)
+            arbiter.release_before(core.controlunit._tick)
+            logging.debug("%s", core.controlunit)
+            # Input device interrupts are handled by core 0 only
+            if len(in_dev.in_data) != 0 and core.core_id == 0:
+                if in_dev.get_cur_char()[0] <= c:
+                    core.controlunit.interrupt = True
+            core.step()
+            if core.halted:
+                running.remove(core)
+            c += 1
+    except BufferError:
+        logging.debug("Input buffer is empty")
+        return
+    logging.debug(f"Simulation stopted Total ticks: {max(core.controlunit._tick for core in all_cores)}")
+    print(*out_dev.output_data)
+    if running:
+        # The report below describes an unfinished run
+        print(
+            "stopped at instruction limit {}, still running: {}".format(
+                limit, " ".join(f"core{core.core_id}" for core in running)
+            )
+        )
+    for line in report(all_cores, arbiter):
+        print(line)
+
+
+def main(instr_f: str, data_f: str, input_f: str, cores: int):
+    inst_p, data_p = load_code_data(instr_f, data_f)
+
+    inst_isr, data_isr = load_code_data("static/isr/instr.json", "static/isr/data.json")
+
+    with open(input_f, encoding="utf-8") as f:
+        data = yaml.safe_load(f.read())
+    simulation(
+        limit=100000,
+        inst_mem=inst_p,
+        data_mem=data_p,
+        inst_isr=inst_isr,
+        data_isr=data_isr,
+        input_data=data,
+        cores=cores,
+    )
+
+
+if __name__ == "__main__":
+    logging.getLogger().setLevel(logging.DEBUG)
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "inputs",
+        metavar="INPUT",
+        nargs="*",
+        help="<path to file with instruction memory> <path to file with data memory> <path to input file>",
+    )
+    parser.add_argument("--cores", type=int, default=2, help="number of cores sharing data memory")
+    namespace = parser.parse_args()
+    args: list[str] = namespace.inputs
+    assert len(args) == 3, "There should be three arguments"
+    main(args[0], args[1], args[2], namespace.cores)
@@ -0,0 +1,26 @@
+import contextlib
+import io
+
+import pytest
+
+import multicore
+from isa import DataType, Opcode
+
+
+def test_report_tells_that_run_is_unfinished():
+    loop = [{"opcode": Opcode.jmp, "arg": 0, "address_type": False, "immediate": False}]
+    with contextlib.redirect_stdout(io.StringIO()) as stdout:
+        multicore.simulation(limit=50, inst_mem=loop, data_mem=[], inst_isr=[], data_isr=[], input_data=[], cores=2)
+    assert "stopped at instruction limit 50, still running: core0 core1" in stdout.getvalue()
+
+
+@pytest.mark.parametrize("cores", [0, -1])
+def test_core_count_is_validated(cores):
+    with pytest.raises(ValueError, match="cores"):
+        multicore.simulation(limit=10, inst_mem=[], data_mem=[], inst_isr=[], data_isr=[], input_data=[], cores=cores)
+
+
+def test_core_stacks_overlapping_data_are_rejected():
+    data = [{"name": "x", "type": DataType.num, "val": "0", "l2l": False}] * 100
+    with pytest.raises(MemoryError):
+        multicore.simulation(limit=10, inst_mem=[], data_mem=data, inst_isr=[], data_isr=[], input_data=[], cores=199)
@@ -0,0 +1,96 @@
+from typing import Optional
+
+import numpy as np
+
+from isa import Opcode
+
+# Marker for a missing value in integer columns: instruction without operand or without memory write
+no_value = -(2**31)
+
+# Bits of the flags column
+flag_zero = 1
+flag_negative = 2
+flag_ei = 4
+flag_interrupt = 8
+
+opcodes = list(Opcode)
+opcode_codes = {opcode: code for code, opcode in enumerate(opcodes)}
+
+column_types = {
+    "tick": np.int64,
+    "pc": np.int32,
+    "opcode": np.uint8,
+    "arg": np.int32,
+    "acc": np.int64,
+    "ar": np.int32,
+    "sp": np.int32,
+    "flags": np.uint8,
+    "mem_addr": np.int32,
+    "mem_val": np.int64,
+}
+
+
+class TraceRecorder:
+    """Покомандная трасса модели в типизированных столбцах, сохраняется в .npz.
+
+    Строка -- одна инструкция: такт и PC на момент выборки, код операции и аргумент,
+    ACC, AR, SP и флаги после исполнения, адрес и значение записи в память данных.
+    Память под столбцы выделяется блоками по chunk_size строк.
+    """
+
+    path: str
+    chunk_size: int
+    chunks: list[dict]
+    current: dict
+    size: int
+
+    def __init__(self, path: str, chunk_size: int = 2**16) -> None:
+        self.path = path
+        self.chunk_size = chunk_size
+        self.chunks = []
+        self.current = self.allocate()
+        self.size = 0
+
+    def allocate(self) -> dict:
+        return {name: np.empty(self.chunk_size, dtype=dtype) for name, dtype in column_types.items()}
+
+    def record(self, tick: int, pc: int, controlunit) -> None:
+        if self.size == self.chunk_size:
+            self.chunks.append(self.current)
+            self.current = self.allocate()
+            self.size = 0
+        datapath = controlunit.datapath
+        instr = datapath.ir
+        row = self.size
+        c = self.current
+        c["tick"][row] = tick
+        c["pc"][row] = pc
+        c["opcode"][row] = opcode_codes[instr["opcode"]]
+        c["arg"][row] = no_value if instr["arg"] is None else instr["arg"]
+        c["acc"][row] = int(datapath.acc["val"])
+        c["ar"][row] = datapath.ar
+        c["sp"][row] = datapath.sp
+        c["flags"][row] = (
+            (flag_zero if datapath.alu.zero_flag else 0)
+            | (flag_negative if datapath.alu.negative_flag else 0)
+            | (flag_ei if controlunit.ei else 0)
+            | (flag_interrupt if controlunit.isr_active else 0)
+        )
+        if datapath.last_write is None:
+            c["mem_addr"][row] = no_value
+            c["mem_val"][row] = no_value
+        else:
+            c["mem_addr"][row], c["mem_val"][row] = datapath.last_write
+        self.size += 1
+
+    def columns(self) -> dict:
+        parts = [*self.chunks, {name: col[: self.size] for name, col in self.current.items()}]
+        return {name: np.concatenate([part[name] for part in parts]) for name in column_types}
+
+    def save(self, path: Optional[str] = None) -> None:
+        np.savez(path or self.path, opcodes=np.array([opcode.value for opcode in opcodes]), **self.columns())
+
+
+def load_trace(path: str) -> dict:
+    with np.load(path) as f:
+        return {name: f[name] for name in f.files}
@@ -0,0 +1,46 @@
+import contextlib
+import io
+import logging
+import os
+import tempfile
+
+import numpy as np
+import yaml
+
+import machine
+import tracer
+import translator
+
+
+def test_trace_matches_debug_log(caplog):
+    caplog.set_level(logging.DEBUG)
+    with open("golden/prob1_imm.yml", encoding="utf-8") as file:
+        golden = yaml.safe_load(file)
+
+    with tempfile.TemporaryDirectory() as tmpdirname:
+        prog = os.path.join(tmpdirname, "prog.txt")
+        input_stream = os.path.join(tmpdirname, "input.yml")
+        data = os.path.join(tmpdirname, "data.json")
+        instr = os.path.join(tmpdirname, "instr.json")
+        trace_f = os.path.join(tmpdirname, "trace.npz")
+
+        with open(prog, "w", encoding="utf-8") as file:
+            file.write(golden["in_source"])
+        with open(input_stream, "w", encoding="utf-8") as file:
+            yaml.dump(golden["in_stdin"], file)
+
+        translator.Translator(prog, instr, data).translate()
+        with contextlib.redirect_stdout(io.StringIO()):
+            machine.main(instr_f=instr, data_f=data, input_f=input_stream, trace_f=trace_f)
+        trace = tracer.load_trace(trace_f)
+
+    # Every instruction is logged before execution as "tick:<tick> pc:<pc> ..."
+    logged = [line.split()[2:4] for line in caplog.text.splitlines() if "Opcode:" in line]
+    assert [[f"tick:{t}", f"pc:{p}"] for t, p in zip(trace["tick"], trace["pc"])] == logged
+
+    opcodes = trace["opcodes"][trace["opcode"]]
+    assert opcodes[-1] == "hlt"
+    assert np.all(np.diff(trace["tick"]) > 0)
+    # The result is written to the output device register
+    out = trace["mem_addr"] == 1
+    assert trace["mem_val"][out].tolist() == [2318]
@@ -1,7 +1,7 @@
 import argparse
 from typing import Optional
 
-from isa import DataType, Opcode, write_code
+from isa import DataType, Opcode, immediate_instructions, write_code
 
 
 def symbol2opcode(symbol):
@@ -23,6 +23,17 @@ def symbol2opcode(symbol):
         "jnz": Opcode.jnz,
         "jn": Opcode.jn,
         "jnn": Opcode.jnn,
+        "mul": Opcode.mul,
+        "div": Opcode.div,
+        "shl": Opcode.shl,
+        "shr": Opcode.shr,
+        "and": Opcode.and_,
+        "or": Opcode.or_,
+        "cid": Opcode.cid,
+        "ncores": Opcode.ncores,
+        "tas": Opcode.tas,
+        "call": Opcode.call,
+        "ret": Opcode.ret,
     }.get(symbol)
 
 
@@ -38,6 +49,11 @@ class Translator:
     labels: list[dict]
     instructions: list[dict]
     label_pos: dict
+    # Sections of labels ("text" or "data") and symbol tables for separate compilation
+    label_section: dict
+    exports: list[str]
+    imports: list[str]
+    relocations: list[dict]
 
     def __init__(
         self, path_to_program: str, out_instructions_file_name: str, out_data_file_name: Optional[str] = None
@@ -45,6 +61,10 @@ class Translator:
         self.labels = []
         self.instructions = []
         self.label_pos = dict()
+        self.label_section = dict()
+        self.exports = []
+        self.imports = []
+        self.relocations = []
         self.out_instructions_file_name = out_instructions_file_name
         self.out_data_file_name = out_data_file_name
         self.file_data = self.read_data_from_file(path_to_program)
@@ -55,15 +75,49 @@ class Translator:
 
     def translate(self):
         self.parse()
+        if self.imports:
+            # Extern symbols are resolved only by the linker, translate the module with --object
+            raise ValueError
         write_code(self.labels, self.out_data_file_name)
         write_code(self.instructions, self.out_instructions_file_name)
 
+    def translate_object(self):
+        """Оттранслировать модуль в перемещаемый объектный файл для компоновщика"""
+        self.parse()
+        for name in self.exports:
+            if name not in self.label_pos:
+                raise ValueError
+        obj = {
+            "text": self.instructions,
+            "data": self.labels,
+            "exports": {
+                name: {"section": self.label_section[name], "pos": self.label_pos[name]} for name in self.exports
+            },
+            "imports": self.imports,
+            "relocations": self.relocations,
+        }
+        write_code(obj, self.out_instructions_file_name)
+
     def parse(self):
+        self.parse_directives()
         self.skip()
         programm_lines = self.delete_spaces_comments()
         self.parse_labels(programm_lines)
         self.parse_instructions(programm_lines)
 
+    def parse_directives(self):
+        # .global <label> - label can be used by other modules, .extern <label> - label is defined in another module
+        lines = []
+        for line in self.file_data.split("\n"):
+            words = line.split()
+            if words and words[0] == ".global":
+                self.exports.extend(words[1:])
+            elif words and words[0] == ".extern":
+                self.imports.extend(words[1:])
+            else:
+                lines.append(line)
+        self.file_data = "\n".join(lines)
+
     def skip(self):
         d = self.file_data.find(".data")
         t = self.file_data.find(".text")
@@ -106,6 +160,7 @@ class Translator:
             # Points to the memory cell
             if len(line) == 1:
                 self.label_pos[name] = instr_mem_pointer
+                self.label_section[name] = "text"
             if (len(line) == 3) or string:
                 l2l = False
                 datatype = symbol2datatype(line[1]).name
@@ -116,12 +171,13 @@ class Translator:
                 # Если нужно получить в переменную адрес другой переменной
                 # word: string 'hello'
                 # pointer: num word
-                if val in self.label_pos:
-                    val = str(self.label_pos[val])
+                if val in self.label_pos or val in self.imports:
+                    val = str(self.resolve_label(val, "data", data_mem_pointer))
                     l2l = True
                 if var_type == DataType.char.name:
                     val = self.save_char_in_mem(string)
                 # Строка - набор char, каждый char храниться в отдельной ячейке
+                self.label_section[name] = "data"
                 if var_type is DataType.string.name:
                     self.label_pos[name] = data_mem_pointer
                     offset = self.save_string_in_mem(string)
@@ -131,6 +187,30 @@ class Translator:
                 self.label_pos[name] = data_mem_pointer
                 data_mem_pointer += 1
 
+    def parse_immediate(self, opcode: Opcode, operand: str) -> int:
+        # Immediate addressing, the operand is stored in the instruction itself
+        if opcode not in immediate_instructions:
+            raise ValueError
+        arg = int(operand[1:])
+        if not -(2**15) <= arg < 2**15:
+            raise ValueError
+        if opcode in {Opcode.shl, Opcode.shr} and arg < 0:
+            # Shift count can't be negative
+            raise ValueError
+        if opcode in {Opcode.div, Opcode.mod} and arg == 0:
+            # Division by zero
+            raise ValueError
+        return arg
+
+    def resolve_label(self, name: str, section: str, pos: int) -> int:
+        # Remember where the address is used, the linker moves it together with the section of the label
+        if name in self.imports:
+            # The address is unknown until linking
+            self.relocations.append({"section": section, "pos": pos, "symbol": name})
+            return 0
+        self.relocations.append({"section": section, "pos": pos, "target": self.label_section[name]})
+        return self.label_pos[name]
+
     def save_char_in_mem(self, val: str) -> int:
         quotes = val.find("'")
         if quotes != -1:
@@ -161,16 +241,20 @@ class Translator:
             pos = lines[i].find(":")
             if pos != -1:
                 continue
-            opcode = symbol2opcode(line[0]).name
+            opcode = symbol2opcode(line[0]).value
             # If address_type == False => direct addressing
             address_type = False
+            immediate = False
             if opcode is None:
                 raise ValueError
             # instructions with no operand
             if len(line) == 1:
                 arg = None
             else:
-                if line[1].isnumeric():
+                if line[1].startswith("#"):
+                    arg = self.parse_immediate(Opcode(opcode), line[1])
+                    immediate = True
+                elif line[1].isnumeric():
                     arg = int(line[1])
                 else:
                     # Replace label with position in data memory or instruction memory
@@ -180,8 +264,10 @@ class Translator:
                         line[1] = line[1].replace("]", "")
                         # Indirect addressing
                         address_type = True
-                    arg = self.label_pos[line[1]]
-            self.instructions.append({"opcode": f"{opcode}", "arg": f"{arg}", "address_type": address_type})
+                    arg = self.resolve_label(line[1], "text", counter)
+            self.instructions.append(
+                {"opcode": f"{opcode}", "arg": f"{arg}", "address_type": address_type, "immediate": immediate}
+            )
             counter += 1
 
 
@@ -193,11 +279,20 @@ def main():
         nargs="*",
         help="<file_with_programm> <file for encoded instructions> <file for encoded data>",
     )
-    args = parser.parse_args().inputs
+    parser.add_argument(
+        "--object",
+        action="store_true",
+        help="translate a module into an object file: <file_with_programm> <object file>",
+    )
+    namespace = parser.parse_args()
+    args = namespace.inputs
     assert len(args) > 1, "The number of arguments have to be at least 2"
 
     t = Translator(*args)
-    t.translate()
+    if namespace.object:
+        t.translate_object()
+    else:
+        t.translate()
 
 
 if __name__ == "__main__":
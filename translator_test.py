@@ -0,0 +1,15 @@
+import os
+
+import pytest
+
+import translator
+
+
+@pytest.mark.parametrize("instruction", ["div #0", "mod #0", "shl #-1", "shr #-1", "add #40000", "store #1"])
+def test_invalid_immediate_is_rejected(tmp_path, instruction):
+    prog = os.path.join(tmp_path, "prog.txt")
+    with open(prog, "w", encoding="utf-8") as file:
+        file.write(f".text:\n    load #5\n    {instruction}\n    hlt\n")
+    t = translator.Translator(prog, os.path.join(tmp_path, "instr.json"), os.path.join(tmp_path, "data.json"))
+    with pytest.raises(ValueError):  # noqa: PT011 translator reports errors without message
+        t.translate()
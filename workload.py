@@ -0,0 +1,366 @@
+import argparse
+import operator
+import random
+import string
+
+import yaml
+
+from isa import load_code_data
+from machine import DataPath, ExternalDevice, dma_length_register, input_buffer_start
+
+# ALU keeps every result in a signed machine word
+word_size = 32
+# Keeps the result of every block in the range of an immediate operand
+mask = 2**15 - 1
+
+operations = {
+    "add": operator.add,
+    "sub": operator.sub,
+    "mul": operator.mul,
+    "div": operator.floordiv,
+    "mod": operator.mod,
+    "shl": operator.lshift,
+    "shr": operator.rshift,
+    "and": operator.and_,
+    "or": operator.or_,
+}
+# Operations with a data cell operand, the rest get a small immediate
+cell_operations = ["add", "sub", "and", "or"]
+immediate_ranges = {
+    "add": (1, 1000),
+    "sub": (1, 1000),
+    "mul": (2, 9),
+    "div": (2, 9),
+    "mod": (2, 1000),
+    "shl": (1, 3),
+    "shr": (1, 3),
+    "and": (0, mask),
+    "or": (0, mask),
+}
+
+
+def memory_layout(isr_instr_f: str = "static/isr/instr.json", isr_data_f: str = "static/isr/data.json") -> dict:
+    """Границы памяти для программы, вычисленные по загруженному образу обработчика прерывания"""
+    inst_isr, data_isr = load_code_data(isr_instr_f, isr_data_f)
+    image = DataPath(0, inst_isr, data_isr, ExternalDevice(), ExternalDevice())
+    isr_data_start = image.data_empty_cell - len(data_isr)
+    return {
+        # Cell of ISR data with the address of the next free cell of the input buffer
+        "isr_write_pointer": isr_data_start + [cell["name"] for cell in data_isr].index("buf_address"),
+        # Program data lies between ISR data and DMA registers, instructions after ISR code
+        "max_data_cells": dma_length_register - image.data_empty_cell,
+        "max_instructions": len(image.inst_mem) - image.instr_empty_cell,
+    }
+
+
+def wrap(val: int) -> int:
+    return (val + 2 ** (word_size - 1)) % 2**word_size - 2 ** (word_size - 1)
+
+
+class Workload:
+    """Генератор синтетической программы для транслятора с заранее вычисленным выводом.
+
+    Программа -- базовые блоки арифметики над ячейкой acc, сгруппированные во вложенные циклы,
+    затем вывод acc, строк секции данных и хеша символов, пришедших по прерываниям.
+    Между блоками открывается окно прерываний(ei, di), после него принятый символ сразу
+    забирается из входного буфера, поэтому кол-во событий ввода не ограничено размером буфера.
+    Частота событий задаётся средним числом инструкций между ними.
+    """
+
+    blocks: int
+    ops_per_block: int
+    loop_depth: int
+    trip_count: int
+    blocks_per_loop: int
+    data_size: int
+    strings: int
+    string_length: int
+    events: int
+    event_gap: int
+    rng: random.Random
+    layout: dict
+
+    data: list[int]
+    acc: int
+    string_values: list[str]
+    block_ops: list[dict]
+    schedule: list
+    text: list[str]
+
+    def __init__(
+        self,
+        blocks: int = 8,
+        ops_per_block: int = 4,
+        loop_depth: int = 1,
+        trip_count: int = 3,
+        blocks_per_loop: int = 4,
+        data_size: int = 16,
+        strings: int = 2,
+        string_length: int = 8,
+        events: int = 5,
+        event_gap: int = 50,
+        seed: int = 0,
+    ) -> None:
+        self.layout = memory_layout()
+        if data_size < 1 or blocks < 1 or blocks_per_loop < 1:
+            raise ValueError
+        if event_gap < 1:
+            raise ValueError("event_gap")
+        if not 1 <= trip_count < 2**15:
+            # Trip count is loaded by an immediate operand
+            raise ValueError("trip_count")
+        if events < 0:
+            raise ValueError("events")
+        if data_size + strings * (string_length + 1) + loop_depth + 8 > self.layout["max_data_cells"]:
+            raise ValueError("max_data_cells")
+        self.blocks = blocks
+        self.ops_per_block = ops_per_block
+        self.loop_depth = loop_depth
+        self.trip_count = trip_count
+        self.blocks_per_loop = blocks_per_loop
+        self.data_size = data_size
+        self.strings = strings
+        self.string_length = string_length
+        self.events = events
+        self.event_gap = event_gap
+        self.rng = random.Random(seed)
+
+        self.data = [self.rng.randint(1, 255) for _ in range(data_size)]
+        self.acc = self.rng.randint(0, mask)
+        self.string_values = [
+            "".join(self.rng.choice(string.ascii_lowercase) for _ in range(string_length)) for _ in range(strings)
+        ]
+        self.block_ops = [self.generate_block() for _ in range(blocks)]
+        self.schedule = self.generate_schedule()
+        self.text = []
+
+    def generate_operation(self) -> tuple[str, str, int]:
+        # (operation, "cell" or "imm", number of cell or value)
+        name = self.rng.choice(list(operations))
+        if name in cell_operations and self.rng.random() < 0.5:
+            return name, "cell", self.rng.randrange(self.data_size)
+        return name, "imm", self.rng.randint(*immediate_ranges[name])
+
+    def generate_block(self) -> dict:
+        return {
+            "ops": [self.generate_operation() for _ in range(self.ops_per_block)],
+            # The extra operation is done only if acc >= data[cmp]
+            "cmp": self.rng.randrange(self.data_size),
+            "extra": self.generate_operation(),
+        }
+
+    def generate_schedule(self) -> list:
+        schedule = []
+        time = 0
+        for _ in range(self.events):
+            time += self.rng.randint(1, 2 * self.event_gap - 1)
+            schedule.append([time, self.rng.choice(string.ascii_lowercase)])
+        return schedule
+
+    def input_schedule(self) -> list:
+        return [list(event) for event in self.schedule]
+
+    def operand(self, kind: str, val: int) -> str:
+        return f"d{val}" if kind == "cell" else f"#{val}"
+
+    def emit(self, line: str, indent: int = 2) -> None:
+        self.text.append("    " * indent + line)
+
+    def emit_block(self, number: int, block: dict) -> None:
+        self.emit(f"b{number}:", 1)
+        self.emit("load acc")
+        for name, kind, val in block["ops"]:
+            self.emit(f"{name} {self.operand(kind, val)}")
+        self.emit(f"and #{mask}")
+        self.emit("store acc")
+        self.emit(f"cmp d{block['cmp']}")
+        self.emit(f"jn b{number}_end")
+        name, kind, val = block["extra"]
+        self.emit(f"{name} {self.operand(kind, val)}")
+        self.emit(f"and #{mask}")
+        self.emit("store acc")
+        self.emit(f"b{number}_end:", 1)
+        # Window for input interrupts, ISR changes ACC, so it is opened after acc is stored
+        self.emit("ei")
+        self.emit("di")
+        if self.schedule:
+            self.emit("call drain")
+
+    def emit_loops(self, nest: int, first: int, last: int) -> None:
+        for level in range(self.loop_depth):
+            self.emit(f"load #{self.trip_count}")
+            self.emit(f"store i{level}")
+            self.emit(f"loop{nest}_{level}:", 1)
+        for number in range(first, last):
+            self.emit_block(number, self.block_ops[number])
+        for level in reversed(range(self.loop_depth)):
+            self.emit(f"load i{level}")
+            self.emit("sub #1")
+            self.emit(f"store i{level}")
+            self.emit(f"jnz loop{nest}_{level}")
+
+    def emit_strings(self) -> None:
+        for line in [
+            "print_str:",
+            "    load [str_ptr]",
+            "    cmp nul",
+            "    jz next_str",
+            "    store [out_d]",
+            "    load str_ptr",
+            "    add #1",
+            "    store str_ptr",
+            "    jmp print_str",
+            "next_str:",
+            "    load str_ptr",
+            "    add #1",
+            "    store str_ptr",
+            "    load str_left",
+            "    sub #1",
+            "    store str_left",
+            "    jnz print_str",
+        ]:
+            self.emit(line, 1)
+
+    def emit_wait(self) -> None:
+        # Open windows until all characters are received, then print their hash
+        for line in [
+            "wait:",
+            "    load in_left",
+            "    cmp #0",
+            "    jz wait_end",
+            "    ei",
+            "    di",
+            "    call drain",
+            "    jmp wait",
+            "wait_end:",
+            "    load in_hash",
+            "    store [out_d]",
+        ]:
+            self.emit(line, 1)
+
+    def emit_drain(self) -> None:
+        # Take characters written by ISR into the hash, then move both buffer pointers back to the start
+        for line in [
+            "drain:",
+            "    load buf_address",
+            "    cmp [isr_pointer]",
+            "    jz drain_end",
+            "    load in_hash",
+            "    mul #31",
+            "    add [buf_address]",
+            f"    and #{mask}",
+            "    store in_hash",
+            "    load in_left",
+            "    sub #1",
+            "    store in_left",
+            "    load buf_address",
+            "    add #1",
+            "    store buf_address",
+            "    jmp drain",
+            "drain_end:",
+            f"    load #{input_buffer_start}",
+            "    store [isr_pointer]",
+            "    store buf_address",
+            "    ret",
+        ]:
+            self.emit(line, 1)
+
+    def data_section(self) -> list[str]:
+        lines = [
+            f"acc: num {self.acc}",
+            "nul: char '\\0'",
+            "out_d: num 1",
+            f"buf_address: num {input_buffer_start}",
+            f"isr_pointer: num {self.layout['isr_write_pointer']}",
+            f"in_left: num {len(self.schedule)}",
+            "in_hash: num 0",
+            f"str_left: num {self.strings}",
+        ]
+        lines += [f"d{number}: num {val}" for number, val in enumerate(self.data)]
+        lines += [f"i{level}: num 0" for level in range(self.loop_depth)]
+        # Strings are placed one after another, so that one pointer walks through all of them
+        lines += [f"s{number}: string '{val}\\0'" for number, val in enumerate(self.string_values)]
+        if self.strings:
+            lines.append("str_ptr: num s0")
+        return ["    " + line for line in lines]
+
+    def source(self) -> str:
+        self.text = []
+        self.emit("di", 1)
+        for nest, first in enumerate(range(0, self.blocks, self.blocks_per_loop)):
+            self.emit_loops(nest, first, min(first + self.blocks_per_loop, self.blocks))
+        self.emit("load acc", 1)
+        self.emit("store [out_d]", 1)
+        if self.strings:
+            self.emit_strings()
+        if self.schedule:
+            self.emit_wait()
+        self.emit("hlt", 1)
+        if self.schedule:
+            self.emit_drain()
+        if sum(1 for line in self.text if not line.endswith(":")) > self.layout["max_instructions"]:
+            raise ValueError("max_instructions")
+        return "\n".join([".data:", *self.data_section(), ".text:", *self.text, ""])
+
+    def apply(self, operation: tuple[str, str, int], acc: int) -> int:
+        name, kind, val = operation
+        return wrap(operations[name](acc, self.data[val] if kind == "cell" else val))
+
+    def run_block(self, block: dict, acc: int) -> int:
+        for operation in block["ops"]:
+            acc = self.apply(operation, acc)
+        acc &= mask
+        if acc >= self.data[block["cmp"]]:
+            acc = self.apply(block["extra"], acc) & mask
+        return acc
+
+    def expected_output(self) -> str:
+        """Вывод программы, вычисленный без модели процессора: так его печатает machine.py"""
+        acc = self.acc
+        for first in range(0, self.blocks, self.blocks_per_loop):
+            nest = self.block_ops[first : first + self.blocks_per_loop]
+            for _ in range(self.trip_count**self.loop_depth):
+                for block in nest:
+                    acc = self.run_block(block, acc)
+        output = [acc, *"".join(self.string_values)]
+        if self.schedule:
+            in_hash = 0
+            for _, char in self.schedule:
+                in_hash = (in_hash * 31 + ord(char)) & mask
+            output.append(in_hash)
+        return " ".join(str(x) for x in output) + "\n"
+
+
+def main(source_f: str, input_f: str, expected_f: str, **params) -> None:
+    workload = Workload(**params)
+    with open(source_f, "w", encoding="utf-8") as f:
+        f.write(workload.source())
+    with open(input_f, "w", encoding="utf-8") as f:
+        yaml.dump(workload.input_schedule(), f)
+    with open(expected_f, "w", encoding="utf-8") as f:
+        f.write(workload.expected_output())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "inputs",
+        metavar="INPUT",
+        nargs="*",
+        help="<file for program> <file for input schedule> <file for expected output>",
+    )
+    parser.add_argument("--blocks", type=int, default=8, help="number of basic blocks")
+    parser.add_argument("--ops-per-block", type=int, default=4, help="arithmetic operations in a block")
+    parser.add_argument("--loop-depth", type=int, default=1, help="nesting of loops around a group of blocks")
+    parser.add_argument("--trip-count", type=int, default=3, help="iterations of every loop")
+    parser.add_argument("--blocks-per-loop", type=int, default=4, help="blocks in one loop nest")
+    parser.add_argument("--data-size", type=int, default=16, help="number of data cells used as operands")
+    parser.add_argument("--strings", type=int, default=2, help="number of strings in data section")
+    parser.add_argument("--string-length", type=int, default=8, help="length of every string")
+    parser.add_argument("--events", type=int, default=5, help="number of input characters")
+    parser.add_argument("--event-gap", type=int, default=50, help="mean number of instructions between input events")
+    parser.add_argument("--seed", type=int, default=0)
+    namespace = vars(parser.parse_args())
+    args: list[str] = namespace.pop("inputs")
+    assert len(args) == 3, "There should be three arguments"
+    main(args[0], args[1], args[2], **namespace)
@@ -0,0 +1,67 @@
+import contextlib
+import io
+import os
+import tempfile
+
+import pytest
+import yaml
+
+import machine
+import translator
+import workload
+
+
+@pytest.mark.parametrize(
+    "params",
+    [
+        {"blocks": 6, "loop_depth": 0, "events": 0, "strings": 0},
+        {"blocks": 10, "loop_depth": 3, "trip_count": 3, "blocks_per_loop": 3, "seed": 1},
+        {"blocks": 4, "ops_per_block": 8, "data_size": 64, "strings": 5, "string_length": 20, "seed": 2},
+        {"blocks": 12, "events": 39, "event_gap": 3, "seed": 3},
+        {"blocks": 6, "trip_count": 40, "events": 500, "event_gap": 2, "seed": 4},
+    ],
+)
+def test_generated_program_output(params):
+    w = workload.Workload(**params)
+    assert run(w) == w.expected_output()
+
+
+def run(w: workload.Workload) -> str:
+    with tempfile.TemporaryDirectory() as tmpdirname:
+        prog = os.path.join(tmpdirname, "prog.txt")
+        input_stream = os.path.join(tmpdirname, "input.yml")
+        data = os.path.join(tmpdirname, "data.json")
+        instr = os.path.join(tmpdirname, "instr.json")
+
+        with open(prog, "w", encoding="utf-8") as file:
+            file.write(w.source())
+        with open(input_stream, "w", encoding="utf-8") as file:
+            yaml.dump(w.input_schedule(), file)
+
+        translator.Translator(prog, instr, data).translate()
+        with contextlib.redirect_stdout(io.StringIO()) as stdout:
+            machine.main(instr_f=instr, data_f=data, input_f=input_stream, limit=10**6)
+    return stdout.getvalue()
+
+
+@pytest.mark.parametrize(
+    ("params", "error"),
+    [
+        ({"trip_count": 2**15}, "trip_count"),
+        ({"trip_count": 0}, "trip_count"),
+        ({"event_gap": 0}, "event_gap"),
+        ({"events": -1}, "events"),
+        ({"data_size": 2000}, "max_data_cells"),
+    ],
+)
+def test_invalid_parameters_are_rejected(params, error):
+    with pytest.raises(ValueError, match=error):
+        workload.Workload(**params)
+
+
+def test_expected_output_wraps_to_machine_word():
+    w = workload.Workload(blocks=1, loop_depth=0, events=0, strings=0)
+    # 32767 * 9^5 * 2 is above 2^31, the following div sees the wrapped value
+    ops = [("or", "imm", 32767), *[("mul", "imm", 9)] * 5, ("shl", "imm", 1), ("div", "imm", 7)]
+    w.block_ops = [{"ops": ops, "cmp": 0, "extra": ("add", "imm", 1)}]
+    assert run(w) == w.expected_output()